@@ -1,17 +1,25 @@
-import os
 import logging
-import sqlite3
 import asyncio
 import json
+import time
 from datetime import datetime, timedelta
-from zoneinfo import ZoneInfo
 from typing import List, Optional
 import re
 import hashlib
+from urllib.parse import urlparse
+from telegram import Update, InputMediaPhoto
+from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, TelegramError, RetryAfter
 from database import db
-from config import BOT_TOKEN, CHANNEL_ID, ADMIN_IDS, CONTACT_USERNAME
+from config import (
+    BOT_TOKEN, CHANNEL_ID, ADMIN_IDS, CONTACT_USERNAME,
+    WEBHOOK_URL, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_SECRET
+)
+
 
 
+_fromiso = datetime.fromisoformat
 
 def parse_db_datetime(dt_value):
     """Safely parse datetime from database (handles both string and datetime objects)"""
@@ -20,26 +28,19 @@ def parse_db_datetime(dt_value):
     if isinstance(dt_value, datetime):
         return dt_value
     if isinstance(dt_value, str):
-        # Try ISO format first
+        # fromisoformat accepts both 'YYYY-MM-DD HH:MM:SS' and 'YYYY-MM-DD'
         try:
-            return datetime.fromisoformat(dt_value.replace(' ', 'T'))
+            return _fromiso(dt_value)
         except ValueError:
-            # Try SQLite format: YYYY-MM-DD HH:MM:SS
-            try:
-                return datetime.strptime(dt_value, '%Y-%m-%d %H:%M:%S')
-            except ValueError:
-                # Try just date
-                try:
-                    return datetime.strptime(dt_value, '%Y-%m-%d')
-                except ValueError:
-                    logger.warning(f"Could not parse datetime: {dt_value}")
-                    return None
+            logger.warning("Could not parse datetime: %s", dt_value)
+            return None
     return None
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, CallbackQueryHandler
-from telegram.constants import ParseMode
-from telegram.error import BadRequest, TelegramError, RetryAfter
+_blake2b = hashlib.blake2b
+
+def callback_hash(file_id: str) -> str:
+    """Short 8-hex-char hash of a file_id for callback data"""
+    return _blake2b(file_id.encode(), digest_size=4).hexdigest()
 
 # Environment variables are loaded in config.py
 
@@ -56,6 +57,10 @@ async def async_db_fetchall(query: str, params: tuple = None):
     """Fetch all DB results non-blocking"""
     return await asyncio.to_thread(db.execute_fetchall, query, params)
 
+async def async_db_execute_with_cursor(callback):
+    """Run a cursor callback non-blocking"""
+    return await asyncio.to_thread(db.execute_with_cursor, callback)
+
 
 # Configure logging
 logging.basicConfig(
@@ -64,31 +69,7 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Database setup
-def init_database():
-    """Initialize database (SQLite or PostgreSQL)"""
-    db.init_database()
-
-class BookBot:
-    def __init__(self, bot_token: str, channel_id: str, admin_ids: List[int] = None):
-        self.bot_token = bot_token
-        self.channel_id = channel_id
-        self.admin_ids = admin_ids or []
-        self.application = Application.builder().token(bot_token).build()
-        self.setup_handlers()
-        
-    def setup_handlers(self):
-        """Setup command and message handlers"""
-        self.application.add_handler(CommandHandler("start", self.start_command))
-        self.application.add_handler(CommandHandler("help", self.help_command))
-        self.application.add_handler(CommandHandler("addadmin", self.add_admin_command))
-        self.application.add_handler(CommandHandler("status", self.status_command))
-        self.application.add_handler(MessageHandler(filters.PHOTO, self.handle_photo))
-        self.application.add_handler(CallbackQueryHandler(self.button_callback))
-        
-    async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle /start command"""
-        welcome_text = """
+WELCOME_TEXT = """
 📚 **BookBot ga xush kelibsiz!**
 
 Bu bot orqali siz kitob rasmlarini yuborib, ularni kanalga avtomatik tarzda joylashtirishingiz mumkin.
@@ -110,12 +91,9 @@ Har bir qator alohida bo'lishi kerak:
 - Narx
 
 /help - yordam olish uchun
-        """
-        await update.message.reply_text(welcome_text, parse_mode=ParseMode.MARKDOWN)
-        
-    async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle /help command"""
-        help_text = """
+"""
+
+HELP_TEXT = """
 📖 **Yordam**
 
 **Buyruqlar:**
@@ -145,69 +123,171 @@ Nashr yili
 Qo'shimcha ma'lumot
 Narx
 ```
-        """
-        await update.message.reply_text(help_text, parse_mode=ParseMode.MARKDOWN)
+"""
+
+# Splits a caption into lines, stripping spaces around each line break in one pass
+LINE_SPLIT = re.compile(r'[^\S\n]*\n[^\S\n]*')
+
+def split_caption_lines(text: str) -> List[str]:
+    """Split a caption into stripped lines"""
+    lines = LINE_SPLIT.split(text)
+    # LINE_SPLIT leaves the caption's outer edges alone; blank edge lines still count
+    lines[0] = lines[0].strip()
+    lines[-1] = lines[-1].strip()
+    return lines
+
+_PARSE_MD = ParseMode.MARKDOWN
+
+# Characters legacy Markdown treats as entity markers; escaped in user-supplied text
+MD_ESCAPE = re.compile(r'([_*`\[])')
+
+def escape_markdown(text: str) -> str:
+    """Backslash-escape legacy Markdown markers so user text can't break the post"""
+    return MD_ESCAPE.sub(r'\\\1', text)
+
+# Channel post caption; the eight caption lines fill the placeholders in order
+POST_TEMPLATE = (
+    "#kitob\n"
+    "📓 **Nomi:** {}\n"
+    "✍️ **Muallifi:** {}\n"
+    "📖 **Beti:** {}\n"
+    "🕵️‍♂️ **Holati:** {}\n"
+    "📚 **Muqovasi:** {}\n"
+    "📅 **Nashr etilgan yili:** {}\n"
+    "📝 **Qo'shimcha ma'lumot:** {}\n"
+    "👤 **Murojaat uchun:** " + escape_markdown(CONTACT_USERNAME).replace('{', '{{').replace('}', '}}') + "\n"
+    "💰 **Narxi:** `{}`"
+).format
+
+# /status reply; the post count fills the placeholder
+STATUS_TEMPLATE = """📊 **Bot Status**
+
+📚 Total posts: {total_posts}
+🤖 Bot is running normally
+            """.format
+
+# SQL used on the hot paths, kept as constants so each string is built once
+# and hits the per-connection statement cache
+_SQL_INSERT_POST = '''
+    INSERT INTO posts (user_id, message_id, channel_message_id, channel_message_ids, text_content, file_ids)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+# PostgreSQL form: psycopg2 placeholders, new id returned by the INSERT itself
+_SQL_INSERT_POST_RETURNING = _SQL_INSERT_POST.replace('?', '%s') + ' RETURNING id'
+_SQL_COUNT_POSTS = 'SELECT COUNT(*) FROM posts'
+_SQL_SELECT_ADMINS = 'SELECT user_id FROM admins'
+_SQL_INSERT_ADMIN = 'INSERT OR IGNORE INTO admins (user_id, username) VALUES (?, ?)'
+_SQL_INSERT_CALLBACK = 'INSERT INTO callback_mappings (callback_hash, file_id) VALUES (?, ?)'
+_SQL_SELECT_CALLBACK = 'SELECT file_id FROM callback_mappings WHERE callback_hash = ?'
+_SQL_DELETE_CALLBACK = 'DELETE FROM callback_mappings WHERE callback_hash = ?'
+_SQL_HAS_STALE_CALLBACKS = 'SELECT EXISTS(SELECT 1 FROM callback_mappings WHERE created_at < {cutoff})'
+_SQL_PRUNE_CALLBACKS = 'DELETE FROM callback_mappings WHERE created_at < {cutoff}'
+
+# BadRequest messages meaning the source message no longer exists (retrying is pointless)
+MESSAGE_GONE = re.compile(r'not found|deleted', re.IGNORECASE)
+
+# Seconds of quiet after the last photo before a media group is processed; the timer starts
+# when the handler runs, so this also has to cover updates queued behind slower handlers
+MEDIA_GROUP_DEBOUNCE = 1.0
+
+# Seconds processed media group data is kept in bot_data
+MEDIA_GROUP_DATA_TTL = 3600
+
+# Upper bound on media groups kept in bot_data; the TTL cleanup job is only a backstop
+MEDIA_GROUP_BUFFER_MAX = 1024
+
+# Callback mappings older than this are pruned (rejected submissions never clean up their own)
+CALLBACK_MAPPING_TTL = timedelta(hours=1)
+
+# The TTL cutoff on the database's own clock, the one the created_at DEFAULT CURRENT_TIMESTAMP
+# uses (UTC on SQLite, the session time zone on PostgreSQL)
+_CALLBACK_CUTOFF_SQL = {
+    'sqlite': f"datetime('now', '-{int(CALLBACK_MAPPING_TTL.total_seconds())} seconds')",
+    'postgresql': f"CURRENT_TIMESTAMP - INTERVAL '{int(CALLBACK_MAPPING_TTL.total_seconds())} seconds'",
+}
+
+# Database setup
+def init_database():
+    """Initialize database (SQLite or PostgreSQL)"""
+    db.init_database()
+
+class BookBot:
+    def __init__(self, bot_token: str, channel_id: str, admin_ids: List[int] = None):
+        self.bot_token = bot_token
+        self.channel_id = channel_id
+        self.admin_ids = frozenset(admin_ids or ())
+        # PTB's default keep-alive pool is kept; only the timeouts are tuned
+        self.application = (
+            Application.builder()
+            .token(bot_token)
+            .pool_timeout(10)
+            .connect_timeout(10)
+            .build()
+        )
+        self.setup_handlers()
+        
+    def setup_handlers(self):
+        """Setup command and message handlers"""
+        self.application.add_handler(CommandHandler("start", self.start_command))
+        self.application.add_handler(CommandHandler("help", self.help_command))
+        self.application.add_handler(CommandHandler("addadmin", self.add_admin_command))
+        self.application.add_handler(CommandHandler("status", self.status_command))
+        self.application.add_handler(MessageHandler(filters.PHOTO, self.handle_photo))
+        self.application.add_handler(CallbackQueryHandler(self.button_callback))
+        
+    async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /start command"""
+        await update.message.reply_text(WELCOME_TEXT, parse_mode=_PARSE_MD)
+        
+    async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /help command"""
+        await update.message.reply_text(HELP_TEXT, parse_mode=_PARSE_MD)
         
     async def add_admin_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /addadmin command"""
         user_id = update.effective_user.id
         
         # Check if user is already admin or in admin list
-        if user_id in self.admin_ids or self.is_admin(user_id):
+        if self.is_admin(user_id):
             await update.message.reply_text("✅ Siz allaqachon admin ekansiz!")
             return
             
-        # Add to admin list
-        self.admin_ids.append(user_id)
-        self.add_admin_to_db(user_id, update.effective_user.username)
+        # Swap in a new admin set (handlers never see it half-updated);
+        # the DB write runs in the background
+        self.admin_ids = self.admin_ids | {user_id}
+        context.application.create_task(self.add_admin_to_db(user_id, update.effective_user.username))
         
         await update.message.reply_text("✅ Siz admin sifatida qo'shildingiz!")
         
     def is_admin(self, user_id: int) -> bool:
-        """Check if user is admin"""
-        if user_id in self.admin_ids:
-            return True
-            
-        # Check database
-        result = db.execute_fetchone('SELECT user_id FROM admins WHERE user_id = ?', (user_id,))
-        return result is not None
+        """Check if user is admin (config and database admins are kept in memory)"""
+        return user_id in self.admin_ids
+
+    def load_admins(self):
+        """Load database admins into the in-memory admin set"""
+        rows = db.execute_fetchall(_SQL_SELECT_ADMINS)
+        self.admin_ids = self.admin_ids.union(row[0] for row in rows)
         
-    def add_admin_to_db(self, user_id: int, username: str = None):
+    async def add_admin_to_db(self, user_id: int, username: str = None):
         """Add admin to database"""
-        db.execute('''
-            INSERT OR REPLACE INTO admins (user_id, username) 
-            VALUES (?, ?)
-        ''', (user_id, username))
+        await async_db_execute(_SQL_INSERT_ADMIN, (user_id, username))
         
     async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /status command"""
         try:
             # Get database stats
-            result = await async_db_fetchone('SELECT COUNT(*) FROM posts')
+            result = await async_db_fetchone(_SQL_COUNT_POSTS)
             total_posts = result[0] if result else 0
             
-            status_text = f"""📊 **Bot Status**
-
-📚 Total posts: {total_posts}
-🤖 Bot is running normally
-            """
-            
-            await update.message.reply_text(status_text, parse_mode=ParseMode.MARKDOWN)
+            await update.message.reply_text(STATUS_TEMPLATE(total_posts=total_posts), parse_mode=_PARSE_MD)
             
         except Exception as e:
-            logger.error(f"Status command error: {e}")
+            logger.error("Status command error: %s", e)
             await update.message.reply_text("❌ Error getting status.")
         
     async def handle_photo(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle photo messages with text"""
         try:
-            # Check if we're already processing a photo for this user
-            if context.user_data.get('processing_photo'):
-                return
-                
-            # Mark that we're processing a photo
-            context.user_data['processing_photo'] = True
-            
             # Get all photos from the message
             photos = update.message.photo
             if not photos:
@@ -225,35 +305,31 @@ Narx
             await self.process_single_photo(update, context)
                 
         except Exception as e:
-            logger.error(f"Photo handling error: {e}")
+            logger.error("Photo handling error: %s", e)
             await update.message.reply_text("❌ Error processing photo. Please try again.")
-        finally:
-            # Clear processing flag
-            context.user_data['processing_photo'] = False
 
     async def buffer_media_group(self, update: Update, context: ContextTypes.DEFAULT_TYPE, media_group_id: str):
         """Buffer photos from media group and process after delay"""
         try:
-            # Initialize bot_data if it doesn't exist
-            if not hasattr(context, 'bot_data') or context.bot_data is None:
-                context.bot_data = {}
-            
             # Initialize media group buffer if not exists
-            if 'media_groups' not in context.bot_data:
-                context.bot_data['media_groups'] = {}
+            media_groups = context.bot_data.setdefault('media_groups', {})
             
             # Add this photo to the group
-            if media_group_id not in context.bot_data['media_groups']:
-                context.bot_data['media_groups'][media_group_id] = {
+            if media_group_id not in media_groups:
+                media_groups[media_group_id] = {
                     'photos': [],
                     'caption': None,
                     'user_id': update.effective_user.id,
-                    'timestamp': datetime.now(),
+                    'timestamp': time.monotonic(),
                     'processed': False,
-                    'scheduled_job': None
+                    'timer': None
                 }
             
-            group_data = context.bot_data['media_groups'][media_group_id]
+            group_data = media_groups[media_group_id]
+            if 'photos' not in group_data:
+                # The group was already flushed (only its processed_data is left); drop the straggler
+                logger.warning("Late photo for already processed media group %s ignored", media_group_id)
+                return
             group_data['photos'].append(update.message)
             
             # Store caption from first message with caption
@@ -263,40 +339,27 @@ Narx
             # Note: We don't process media groups immediately because we need to wait
             # for all photos in the group to arrive before processing
             
-            # Cancel existing job if it exists
-            if group_data.get('scheduled_job'):
-                try:
-                    group_data['scheduled_job'].schedule_removal()
-                except Exception as e:
-                    logger.debug(f"Could not cancel scheduled job for media_group {media_group_id}: {e}")
-            
-            # Schedule new processing job after 1 second delay to ensure all photos are collected
-            job = context.job_queue.run_once(
-                self.process_media_group,
-                when=1,
-                data={'media_group_id': media_group_id}
+            # Debounce: every new photo restarts the flush timer
+            if group_data.get('timer'):
+                group_data['timer'].cancel()
+            
+            # Telegram delivers all items of a media group within a couple hundred ms of each other
+            group_data['timer'] = asyncio.get_running_loop().call_later(
+                MEDIA_GROUP_DEBOUNCE,
+                lambda: context.application.create_task(self.process_media_group(context, media_group_id))
             )
-            group_data['scheduled_job'] = job
             
         except Exception as e:
-            logger.error(f"Media group buffering error: {e}")
+            logger.error("Media group buffering error: %s", e)
             await update.message.reply_text("❌ Error processing media group. Please try again.")
 
-    async def process_media_group(self, context: ContextTypes.DEFAULT_TYPE):
+    async def process_media_group(self, context: ContextTypes.DEFAULT_TYPE, media_group_id: str):
         """Process complete media group after buffering"""
         try:
-            job = context.job
-            media_group_id = job.data['media_group_id']
-            
-            # Initialize bot_data if it doesn't exist
-            if not hasattr(context, 'bot_data') or context.bot_data is None:
-                context.bot_data = {}
-            
-            if 'media_groups' not in context.bot_data or media_group_id not in context.bot_data['media_groups']:
+            group_data = context.bot_data.get('media_groups', {}).get(media_group_id)
+            if group_data is None:
                 return
             
-            group_data = context.bot_data['media_groups'][media_group_id]
-            
             # Check if already processed to prevent duplicate posting
             if group_data.get('processed', False):
                 return
@@ -319,11 +382,11 @@ Narx
             file_id = photo_file_ids[0]
             
             # Create a shorter hash for callback data
-            file_hash = hashlib.md5(file_id.encode()).hexdigest()[:8]
+            file_hash = callback_hash(file_id)
             
             # Store the mapping in database for persistence
             await async_db_execute(
-                "INSERT INTO callback_mappings (callback_hash, file_id) VALUES (?, ?)",
+                _SQL_INSERT_CALLBACK,
                 (file_hash, file_id)
             )
             
@@ -340,12 +403,13 @@ Narx
                 processed_data['pending_text_content'] = caption
                 
                 # Process the text
-                lines = [line.strip() for line in caption.split('\n')]
+                lines = split_caption_lines(caption)
                 
                 if len(lines) >= 8:
                     # Auto-post directly without confirmation
                     result = await self.post_book_content(
                         text_content=caption,
+                        lines=lines,
                         photos=photos,
                         photo_file_ids=photo_file_ids,
                         user_id=user_id,
@@ -354,14 +418,15 @@ Narx
                         is_media_group=True
                     )
                     
-                    await first_message.reply_text(result)
-
-                    # Clean up callback mapping
-                    await async_db_execute("DELETE FROM callback_mappings WHERE callback_hash = ?", (file_hash,))
+                    # Reply and clean up the callback mapping concurrently
+                    await asyncio.gather(
+                        first_message.reply_text(result),
+                        async_db_execute(_SQL_DELETE_CALLBACK, (file_hash,))
+                    )
                     
                     # Mark as processed to prevent duplicate posting
                     group_data['processed'] = True
-                    group_data['scheduled_job'] = None
+                    group_data['timer'] = None
                     
                     # Clean up media group data after successful posting
                     if 'media_groups' in context.bot_data and media_group_id in context.bot_data['media_groups']:
@@ -372,7 +437,7 @@ Narx
                     )
                     # Mark as processed to prevent duplicate processing
                     group_data['processed'] = True
-                    group_data['scheduled_job'] = None
+                    group_data['timer'] = None
             else:
                 # No text provided, reject the submission
                 await first_message.reply_text(
@@ -380,23 +445,36 @@ Narx
                 )
                 # Mark as processed to prevent duplicate processing
                 group_data['processed'] = True
-                group_data['scheduled_job'] = None
+                group_data['timer'] = None
             
             # Store processed data in bot_data for later retrieval
             context.bot_data['media_groups'][media_group_id] = {
                 'processed_data': processed_data,
-                'timestamp': datetime.now()
+                'timestamp': time.monotonic()
             }
+            # Reverse index so confirm_and_post can find the group by file_id
+            context.bot_data.setdefault('file_id_to_group', {})[file_id] = media_group_id
+            self.evict_media_groups(context)
             
             # Schedule cleanup of processed data after 1 hour
             context.job_queue.run_once(
                 self.cleanup_media_group_data,
-                when=3600,  # 1 hour
+                when=MEDIA_GROUP_DATA_TTL,
                 data={'media_group_id': media_group_id}
             )
                 
         except Exception as e:
-            logger.error(f"Media group processing error: {e}")
+            logger.error("Media group processing error: %s", e)
+
+    def evict_media_groups(self, context: ContextTypes.DEFAULT_TYPE):
+        """Drop the oldest media groups once bot_data holds more than MEDIA_GROUP_BUFFER_MAX"""
+        media_groups = context.bot_data.get('media_groups', {})
+        file_id_to_group = context.bot_data.get('file_id_to_group', {})
+        # dicts keep insertion order, so the first key is the oldest group
+        while len(media_groups) > MEDIA_GROUP_BUFFER_MAX:
+            group_data = media_groups.pop(next(iter(media_groups)))
+            file_id = group_data.get('processed_data', {}).get('pending_file_id')
+            file_id_to_group.pop(file_id, None)
 
     async def cleanup_media_group_data(self, context: ContextTypes.DEFAULT_TYPE):
         """Clean up old media group data"""
@@ -405,10 +483,12 @@ Narx
             media_group_id = job.data['media_group_id']
             
             if 'media_groups' in context.bot_data and media_group_id in context.bot_data['media_groups']:
-                del context.bot_data['media_groups'][media_group_id]
-                logger.info(f"Cleaned up media group data for {media_group_id}")
+                group_data = context.bot_data['media_groups'].pop(media_group_id)
+                file_id = group_data.get('processed_data', {}).get('pending_file_id')
+                context.bot_data.get('file_id_to_group', {}).pop(file_id, None)
+                logger.info("Cleaned up media group data for %s", media_group_id)
         except Exception as e:
-            logger.error(f"Error cleaning up media group data: {e}")
+            logger.error("Error cleaning up media group data: %s", e)
 
     async def process_single_photo(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Process single photo (existing logic)"""
@@ -427,11 +507,11 @@ Narx
             file_id = photo_file_ids[0]
             
             # Create a shorter hash for callback data
-            file_hash = hashlib.md5(file_id.encode()).hexdigest()[:8]
+            file_hash = callback_hash(file_id)
             
             # Store the mapping in database for persistence
             await async_db_execute(
-                "INSERT INTO callback_mappings (callback_hash, file_id) VALUES (?, ?)",
+                _SQL_INSERT_CALLBACK,
                 (file_hash, file_id)
             )
             
@@ -447,7 +527,7 @@ Narx
                 context.user_data['pending_text_content'] = text_content
                 
                 # Process the text
-                lines = [line.strip() for line in text_content.split('\n')]
+                lines = split_caption_lines(text_content)
                 
                 if len(lines) >= 8:
                     # Auto-post directly without confirmation
@@ -456,6 +536,7 @@ Narx
                     
                     result = await self.post_book_content(
                         text_content=text_content,
+                        lines=lines,
                         photos=photos,
                         photo_file_ids=photo_file_ids,
                         user_id=update.effective_user.id,
@@ -464,10 +545,11 @@ Narx
                         is_media_group=False
                     )
                     
-                    await update.message.reply_text(result)
-
-                    # Clean up callback mapping
-                    await async_db_execute("DELETE FROM callback_mappings WHERE callback_hash = ?", (file_hash,))
+                    # Reply and clean up the callback mapping concurrently
+                    await asyncio.gather(
+                        update.message.reply_text(result),
+                        async_db_execute(_SQL_DELETE_CALLBACK, (file_hash,))
+                    )
                 else:
                     await update.message.reply_text(
                         "❌ Kamida 8 qator matn kerak. Rasm bilan birga to'liq matnni yuboring va qaytadan urinib ko'ring."
@@ -479,7 +561,7 @@ Narx
                 )
                 
         except Exception as e:
-            logger.error(f"Single photo processing error: {e}")
+            logger.error("Single photo processing error: %s", e)
             await update.message.reply_text("❌ Error processing photo. Please try again.")
             
     async def button_callback(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -497,7 +579,7 @@ Narx
         action, file_hash = data.split('_', 1)
         
         # Get the actual file_id from the database
-        mapping = await async_db_fetchone("SELECT file_id FROM callback_mappings WHERE callback_hash = ?", (file_hash,))
+        mapping = await async_db_fetchone(_SQL_SELECT_CALLBACK, (file_hash,))
         if not mapping:
             await query.edit_message_text("❌ Xatolik: Rasm topilmadi yoki muddati o'tgan.")
             return
@@ -510,27 +592,21 @@ Narx
         elif action == "cancel":
             await query.edit_message_text("❌ Cancelled.")
             
-        # Clear processing flag after any button action
-        context.user_data['processing_photo'] = False
-            
     async def post_book_content(self, text_content: str, photos: list, photo_file_ids: list, 
                                user_id: int, message_id: int, context: ContextTypes.DEFAULT_TYPE, 
-                               is_media_group: bool = False):
+                               is_media_group: bool = False, lines: List[str] = None):
         """Post book content to channel - extracted reusable method"""
         try:
-            # Save to database first to get post_id
-            post_id = self.save_post(
-                user_id=user_id,
-                message_id=message_id,
-                channel_message_id=0,  # Will be updated after posting
-                text_content=text_content,
-                file_ids=photo_file_ids  # Store file_ids directly
-            )
-            
+            # Reuse the caller's parsed lines when available
+            if lines is None:
+                lines = split_caption_lines(text_content)
+            if len(lines) < 8:
+                return "❌ Kamida 8 qator matn kerak. Rasm bilan birga to'liq matnni yuboring va qaytadan urinib ko'ring."
+
             # Post to channel with timeout
             try:
                 channel_message = await asyncio.wait_for(
-                    self.post_to_channel(text_content, photo_file_ids, post_id, context),
+                    self.post_to_channel(lines, photo_file_ids, context),
                     timeout=60.0  # 1 minute timeout for posting
                 )
             except asyncio.TimeoutError:
@@ -538,15 +614,23 @@ Narx
                 return "❌ Kanalga joylashtirish vaqtida xatolik. Qaytadan urinib ko'ring."
             
             if channel_message:
-                # Update channel_message_id in database
+                # Save the post once we know its channel message ID(s), in a single INSERT
                 # Handle both single message and list of messages (for media groups)
                 if isinstance(channel_message, list):
                     # Media group: store all message IDs
                     message_ids = [msg.message_id for msg in channel_message]
-                    self.update_channel_message_id(post_id, channel_message[0].message_id, message_ids)
                 else:
                     # Single message
-                    self.update_channel_message_id(post_id, channel_message.message_id, [channel_message.message_id])
+                    message_ids = [channel_message.message_id]
+
+                await self.save_post(
+                    user_id=user_id,
+                    message_id=message_id,
+                    channel_message_id=message_ids[0],
+                    text_content=text_content,
+                    file_ids=photo_file_ids,  # Store file_ids directly
+                    channel_message_ids=message_ids
+                )
                 
                 # Send success message
                 photo_count = len(photos)
@@ -560,7 +644,7 @@ Narx
                 return "❌ Kanalga joylashtirishda xatolik."
                 
         except Exception as e:
-            logger.error(f"Post book content error: {e}")
+            logger.error("Post book content error: %s", e)
             return "❌ Xatolik yuz berdi. Qaytadan urinib ko'ring."
 
     async def confirm_and_post(self, query, file_id: str, context: ContextTypes.DEFAULT_TYPE):
@@ -571,10 +655,10 @@ Narx
             
             # Check if this is from a media group first
             media_group_data = None
-            for group_id, group_data in context.bot_data.get('media_groups', {}).items():
-                if 'processed_data' in group_data and group_data['processed_data'].get('pending_file_id') == file_id:
-                    media_group_data = group_data['processed_data']
-                    break
+            group_id = context.bot_data.get('file_id_to_group', {}).get(file_id)
+            group_data = context.bot_data.get('media_groups', {}).get(group_id)
+            if group_data and 'processed_data' in group_data:
+                media_group_data = group_data['processed_data']
             
             if media_group_data:
                 # Media group - get text from processed data
@@ -620,13 +704,14 @@ Narx
                 is_media_group=is_media_group
             )
             
-            await query.edit_message_text(result)
-
-            # Clean up callback mapping
-            await async_db_execute("DELETE FROM callback_mappings WHERE callback_hash = ?", (file_hash,))
+            # Reply and clean up the callback mapping concurrently
+            await asyncio.gather(
+                query.edit_message_text(result),
+                async_db_execute(_SQL_DELETE_CALLBACK, (callback_hash(file_id),))
+            )
                 
         except Exception as e:
-            logger.error(f"Confirm and post error: {e}")
+            logger.error("Confirm and post error: %s", e)
             await query.edit_message_text("❌ An error occurred.")
             
     # handle_sold_button function removed - Sotildi functionality removed
@@ -635,13 +720,10 @@ Narx
         
     # handle_manual_text function removed - no manual text entry
         
-    def extract_text_from_message(self, message) -> Optional[str]:
+    @staticmethod
+    def extract_text_from_message(message) -> Optional[str]:
         """Extract text from message for posting"""
-        if message.caption:
-            return message.caption
-        elif message.text:
-            return message.text
-        return None
+        return message.caption or message.text
     
     async def repost_with_copy_message(self, context: ContextTypes.DEFAULT_TYPE, from_chat_id: int, 
                                        message_id: int, text_content: str, max_retries: int = 3) -> Optional[int]:
@@ -658,175 +740,137 @@ Narx
                     message_id=message_id,
                     caption=None  # Don't duplicate caption; message already has its content
                 )
-                logger.info(f"Copied message {message_id} to channel, new id: {copied_msg.message_id}")
+                logger.info("Copied message %s to channel, new id: %s", message_id, copied_msg.message_id)
                 return copied_msg  # Return the full message object, not just ID
             
             except RetryAfter as e:
                 # Telegram rate-limited us; respect the server's backoff
                 wait_time = e.retry_after
-                logger.warning(f"RetryAfter from Telegram: waiting {wait_time} seconds (attempt {attempt + 1}/{max_retries})")
+                logger.warning("RetryAfter from Telegram: waiting %s seconds (attempt %s/%s)", wait_time, attempt + 1, max_retries)
                 await asyncio.sleep(wait_time)
                 continue
             
             except BadRequest as e:
-                err_str = str(e).lower()
-                if "not found" in err_str or "deleted" in err_str:
-                    logger.error(f"Message {message_id} not found or deleted: {e}")
+                if MESSAGE_GONE.search(str(e)):
+                    logger.error("Message %s not found or deleted: %s", message_id, e)
                     return None
                 elif attempt < max_retries - 1:
-                    logger.warning(f"BadRequest copying message {message_id} (attempt {attempt + 1}/{max_retries}): {e}")
+                    logger.warning("BadRequest copying message %s (attempt %s/%s): %s", message_id, attempt + 1, max_retries, e)
                     await asyncio.sleep(backoff)
                     backoff = min(backoff * 2, 30)  # Cap at 30 seconds
                     continue
                 else:
-                    logger.error(f"Failed to copy message {message_id} after {max_retries} attempts: {e}")
+                    logger.error("Failed to copy message %s after %s attempts: %s", message_id, max_retries, e)
                     return None
             
             except TelegramError as e:
                 if attempt < max_retries - 1:
-                    logger.warning(f"TelegramError copying message {message_id} (attempt {attempt + 1}/{max_retries}): {e}")
+                    logger.warning("TelegramError copying message %s (attempt %s/%s): %s", message_id, attempt + 1, max_retries, e)
                     await asyncio.sleep(backoff)
                     backoff = min(backoff * 2, 30)
                     continue
                 else:
-                    logger.error(f"Failed to copy message {message_id} after {max_retries} attempts: {e}")
+                    logger.error("Failed to copy message %s after %s attempts: %s", message_id, max_retries, e)
                     return None
             
             except Exception as e:
-                logger.error(f"Unexpected error copying message {message_id}: {e}", exc_info=True)
+                logger.error("Unexpected error copying message %s: %s", message_id, e, exc_info=True)
                 return None
         
         return None
         
-    async def post_to_channel(self, text_content: str, file_ids: list, post_id: int, context: ContextTypes.DEFAULT_TYPE):
-        """Post book to channel with formatted text and multiple photos using file_ids"""
+    async def post_to_channel(self, lines: List[str], file_ids: list, context: ContextTypes.DEFAULT_TYPE):
+        """Post book to channel with formatted text and multiple photos using file_ids (lines holds at least 8 caption lines)"""
         try:
-            lines = [line.strip() for line in text_content.split('\n')]
-            
-            if len(lines) < 8:
-                return None
-                
             # Format the post with the updated style
-            formatted_text = (
-                f"#kitob\n"
-                f"📓 **Nomi:** {lines[0]}\n"
-                f"✍️ **Muallifi:** {lines[1]}\n"
-                f"📖 **Beti:** {lines[2]}\n"
-                f"🕵️‍♂️ **Holati:** {lines[3]}\n"
-                f"📚 **Muqovasi:** {lines[4]}\n"
-                f"📅 **Nashr etilgan yili:** {lines[5]}\n"
-                f"📝 **Qo'shimcha ma'lumot:** {lines[6]}\n"
-                f"👤 **Murojaat uchun:** {CONTACT_USERNAME}\n"
-                f"💰 **Narxi:** `{lines[7]}`"
-            )
+            # Escape the free-text fields; backslashes don't work inside the price's code span,
+            # so a stray backtick there is dropped instead
+            formatted_text = POST_TEMPLATE(*map(escape_markdown, lines[:7]), lines[7].replace('`', ''))
             
-            # Send multiple photos as media group
-            if len(file_ids) > 1:
-                # Send as media group for multiple photos using file_ids
-                media_group = []
-
-                for i, file_id in enumerate(file_ids):
-                    if i == 0:
-                        # First photo gets the caption
-                        media_group.append(InputMediaPhoto(
-                            media=file_id,
-                            caption=formatted_text,
-                            parse_mode=ParseMode.MARKDOWN
-                        ))
-                    else:
-                        # Other photos without caption
-                        media_group.append(InputMediaPhoto(
-                            media=file_id
-                        ))
-
-                # Send media group with targeted exception handling
-                try:
-                    messages = await context.bot.send_media_group(
-                        chat_id=self.channel_id,
-                        media=media_group
-                    )
-                    return messages
-                except BadRequest as e:
-                    logger.error(f"send_media_group BadRequest: {e}", exc_info=True)
-                    # Fallback: send first photo with caption, then remaining photos without caption
-                    try:
-                        first_msg = await context.bot.send_photo(
-                            chat_id=self.channel_id,
-                            photo=file_ids[0],
-                            caption=formatted_text,
-                            parse_mode=ParseMode.MARKDOWN
-                        )
-                        if len(file_ids) > 1:
-                            others = [InputMediaPhoto(media=fid) for fid in file_ids[1:]]
-                            await context.bot.send_media_group(chat_id=self.channel_id, media=others)
-                        return first_msg
-                    except Exception as e2:
-                        logger.error(f"Fallback failed for media group: {e2}", exc_info=True)
-                        return None
-                except TelegramError as e:
-                    logger.error(f"send_media_group TelegramError: {e}", exc_info=True)
-                    return None
-                except Exception as e:
-                    logger.error(f"Unexpected error in send_media_group: {e}", exc_info=True)
-                    return None
-            else:
-                # Single photo using file_id
-                try:
-                    message = await context.bot.send_photo(
-                        chat_id=self.channel_id,
-                        photo=file_ids[0],
-                        caption=formatted_text,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                    return message
-                except BadRequest as e:
-                    logger.error(f"send_photo BadRequest: {e}", exc_info=True)
-                    return None
-                except TelegramError as e:
-                    logger.error(f"send_photo TelegramError: {e}", exc_info=True)
-                    return None
-                except Exception as e:
-                    logger.error(f"Unexpected error in send_photo: {e}", exc_info=True)
-                    return None
+            # Single photos (the common case) never touch the media group path
+            send = self._post_group if len(file_ids) > 1 else self._post_single
+            return await send(formatted_text, file_ids, context)
             
         except Exception as e:
-            logger.error(f"Post to channel error: {e}")
+            logger.error("Post to channel error: %s", e)
+            return None
+
+    async def _post_single(self, formatted_text: str, file_ids: list, context: ContextTypes.DEFAULT_TYPE):
+        """Send a single photo with the post caption"""
+        try:
+            message = await context.bot.send_photo(
+                chat_id=self.channel_id,
+                photo=file_ids[0],
+                caption=formatted_text,
+                parse_mode=_PARSE_MD
+            )
+            return message
+        except BadRequest as e:
+            logger.error("send_photo BadRequest: %s", e, exc_info=True)
+            return None
+        except TelegramError as e:
+            logger.error("send_photo TelegramError: %s", e, exc_info=True)
+            return None
+        except Exception as e:
+            logger.error("Unexpected error in send_photo: %s", e, exc_info=True)
+            return None
+
+    async def _post_group(self, formatted_text: str, file_ids: list, context: ContextTypes.DEFAULT_TYPE):
+        """Send several photos as a media group, caption on the first"""
+        # Send as media group for multiple photos using file_ids;
+        # only the first photo carries the caption
+        media_group = [InputMediaPhoto(media=file_ids[0], caption=formatted_text, parse_mode=_PARSE_MD)]
+        media_group.extend(InputMediaPhoto(media=file_id) for file_id in file_ids[1:])
+
+        # Send media group with targeted exception handling
+        try:
+            messages = await context.bot.send_media_group(
+                chat_id=self.channel_id,
+                media=media_group
+            )
+            return messages
+        except BadRequest as e:
+            logger.error("send_media_group BadRequest: %s", e, exc_info=True)
+            # Fallback: send first photo with caption, then remaining photos without caption
+            try:
+                first_msg = await context.bot.send_photo(
+                    chat_id=self.channel_id,
+                    photo=file_ids[0],
+                    caption=formatted_text,
+                    parse_mode=_PARSE_MD
+                )
+                others = [InputMediaPhoto(media=fid) for fid in file_ids[1:]]
+                await context.bot.send_media_group(chat_id=self.channel_id, media=others)
+                return first_msg
+            except Exception as e2:
+                logger.error("Fallback failed for media group: %s", e2, exc_info=True)
+                return None
+        except TelegramError as e:
+            logger.error("send_media_group TelegramError: %s", e, exc_info=True)
+            return None
+        except Exception as e:
+            logger.error("Unexpected error in send_media_group: %s", e, exc_info=True)
             return None
             
-    def update_channel_message_id(self, post_id: int, channel_message_id: int, all_message_ids: list = None):
-        """Update channel message ID(s) in database"""
-        # Store all message IDs as JSON for media groups
-        if all_message_ids:
-            message_ids_json = json.dumps(all_message_ids)
-            db.execute('''
-                UPDATE posts 
-                SET channel_message_id = ?, channel_message_ids = ? 
-                WHERE id = ?
-            ''', (channel_message_id, message_ids_json, post_id))
-        else:
-            # Backward compatibility: if no list provided, just store single ID
-            db.execute('UPDATE posts SET channel_message_id = ? WHERE id = ?', (channel_message_id, post_id))
-            
-    def save_post(self, user_id: int, message_id: int, channel_message_id: int, 
-                  text_content: str, file_ids: list):
+    async def save_post(self, user_id: int, message_id: int, channel_message_id: int, 
+                  text_content: str, file_ids: list, channel_message_ids: list = None):
         """Save post to database"""
         # Convert file_ids list to JSON string for storage
         file_ids_json = json.dumps(file_ids)
+        # Store all message IDs as JSON for media groups
+        message_ids_json = json.dumps(channel_message_ids or [channel_message_id])
+        
+        params = (user_id, message_id, channel_message_id, message_ids_json, text_content, file_ids_json)
         
         def execute_insert(cursor, conn):
-            cursor.execute('''
-                INSERT INTO posts (user_id, message_id, channel_message_id, text_content, file_ids)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (user_id, message_id, channel_message_id, text_content, file_ids_json))
-            # Get the last inserted ID (works for both SQLite and PostgreSQL)
+            # PostgreSQL hands the new id back with the INSERT itself; SQLite exposes lastrowid
             if db.db_type == 'postgresql':
-                cursor.execute('SELECT LASTVAL()')
-                post_id = cursor.fetchone()[0]
-            else:
-                post_id = cursor.lastrowid
-            return post_id
+                cursor.execute(_SQL_INSERT_POST_RETURNING, params)
+                return cursor.fetchone()[0]
+            cursor.execute(_SQL_INSERT_POST, params)
+            return cursor.lastrowid
         
-        return db.execute_with_cursor(execute_insert)
+        return await async_db_execute_with_cursor(execute_insert)
         
     async def repost_test_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("ℹ️ Repost functionality has been removed.")
@@ -841,13 +885,48 @@ Narx
         """Start the bot"""
         # Initialize database
         init_database()
+        self.load_admins()
         
         # Add error handler
         self.application.add_error_handler(self.error_handler)
+
+        # Periodically drop stale callback mappings
+        ttl_seconds = CALLBACK_MAPPING_TTL.total_seconds()
+        self.application.job_queue.run_repeating(
+            self.prune_callback_mappings,
+            interval=ttl_seconds,
+            first=ttl_seconds
+        )
         
-        # Start the bot
-        self.application.run_polling()
+        # Start the bot: webhook when configured, long polling otherwise
+        if WEBHOOK_URL:
+            self.application.run_webhook(
+                listen=WEBHOOK_HOST,
+                port=WEBHOOK_PORT,
+                # Serve the same path Telegram is told to POST to (PTB only serves '/' otherwise)
+                url_path=urlparse(WEBHOOK_URL).path.lstrip('/'),
+                webhook_url=WEBHOOK_URL,
+                secret_token=WEBHOOK_SECRET
+            )
+        else:
+            self.application.run_polling()
         
+    async def prune_callback_mappings(self, context: ContextTypes.DEFAULT_TYPE):
+        """Delete callback mappings older than CALLBACK_MAPPING_TTL"""
+        try:
+            cutoff = _CALLBACK_CUTOFF_SQL[db.db_type]
+            # Cheap read first so idle runs never take the write lock
+            stale = await async_db_fetchone(
+                _SQL_HAS_STALE_CALLBACKS.format(cutoff=cutoff)
+            )
+            if not stale or not stale[0]:
+                return
+            deleted = await async_db_execute(_SQL_PRUNE_CALLBACKS.format(cutoff=cutoff))
+            if deleted:
+                logger.info("Pruned %s stale callback mappings", deleted)
+        except Exception as e:
+            logger.error("Error pruning callback mappings: %s", e)
+
     async def error_handler(self, update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Log the error."""
         logger.error("Exception while handling an update:", exc_info=context.error)
@@ -1,10 +1,13 @@
 import os
 import sys
 from pathlib import Path
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+# Load environment variables from .env when present (deployments inject them directly).
+# Only the .env next to this file is read; parent directories are not searched.
+_ENV_FILE = Path(__file__).with_name('.env')
+if _ENV_FILE.exists():
+    from dotenv import load_dotenv
+    load_dotenv(_ENV_FILE)
 
 # Bot Configuration
 BOT_TOKEN = os.getenv('BOT_TOKEN')
@@ -21,6 +24,12 @@ CONTACT_USERNAME = os.getenv('CONTACT_USERNAME', '@Yollovchi')
 # Image Configuration
 IMAGES_DIR = 'images'
 
+# Webhook Configuration (long polling is used when WEBHOOK_URL is not set)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', os.getenv('PORT', '8443')))
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+
 
 # Validation
 if not BOT_TOKEN:
@@ -5,20 +5,34 @@ Automatically detects database type from DATABASE_URL environment variable
 """
 
 import os
+import re
+import time
+import atexit
+import queue
 import sqlite3
 import logging
+import threading
+import functools
+from contextlib import contextmanager
 from datetime import datetime
 from typing import Optional, Any
 from urllib.parse import urlparse
 
-# Try to import psycopg2, but don't fail if it's not installed (for SQLite-only setups)
-try:
-    import psycopg2
-    from psycopg2.extras import RealDictCursor
-    from psycopg2 import sql as pg_sql
-    PSYCOPG2_AVAILABLE = True
-except ImportError:
-    PSYCOPG2_AVAILABLE = False
+# psycopg2 is imported on first PostgreSQL use, so SQLite-only setups never load it
+psycopg2 = None
+
+
+def _load_psycopg2():
+    """Import psycopg2 (and its pool and extras modules) the first time PostgreSQL is used"""
+    global psycopg2
+    if psycopg2 is None:
+        try:
+            # Binds the module-level psycopg2 name (declared global above)
+            import psycopg2.pool
+            import psycopg2.extras
+        except ImportError:
+            raise ImportError("psycopg2 is required for PostgreSQL. Install it with: pip install psycopg2-binary")
+    return psycopg2
 
 logger = logging.getLogger(__name__)
 
@@ -43,13 +57,184 @@ def convert_datetime(val):
         try:
             return datetime.strptime(s, '%Y-%m-%d %H:%M:%S')
         except Exception:
-            logger.warning(f"Could not convert datetime: {val}")
+            logger.warning("Could not convert datetime: %s", val)
             return None
 
 # Register the adapter and converter
 sqlite3.register_adapter(datetime, adapt_datetime_iso)
 sqlite3.register_converter("datetime", convert_datetime)
 
+SQLITE_BUSY_RETRIES = 5
+
+# Pooled PostgreSQL connections idle longer than this are pinged before reuse
+PG_IDLE_CHECK_SECONDS = 30
+
+# Bump whenever init_database's DDL changes so existing SQLite files pick it up
+SCHEMA_VERSION = 3
+
+
+def retry_on_busy(func):
+    """Retry a write when SQLite still reports the database as locked after busy_timeout"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(SQLITE_BUSY_RETRIES):
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                message = str(e).lower()
+                if ('locked' not in message and 'busy' not in message) or attempt == SQLITE_BUSY_RETRIES - 1:
+                    raise
+                logger.warning("SQLite busy, retrying write (attempt %s/%s): %s", attempt + 1, SQLITE_BUSY_RETRIES, e)
+                time.sleep(0.1 * 2 ** attempt)
+    return wrapper
+
+
+class PooledConnection(sqlite3.Connection):
+    """SQLite connection that keeps one cursor for its whole lifetime"""
+
+    def shared_cursor(self):
+        """Return this connection's reusable cursor, creating it on first use"""
+        cursor = getattr(self, '_shared_cursor', None)
+        if cursor is None:
+            cursor = self._shared_cursor = self.cursor()
+        return cursor
+
+
+def _connect_sqlite(database: str):
+    """Open a SQLite connection with the bot's PRAGMAs applied once"""
+    # timeout is SQLite's busy timeout; passing it here covers the PRAGMAs below too
+    conn = sqlite3.connect(
+        database,
+        timeout=30,
+        check_same_thread=False,
+        # Autocommit at the driver level; writers open their own BEGIN IMMEDIATE
+        isolation_level=None,
+        cached_statements=256,
+        factory=PooledConnection
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA wal_autocheckpoint=1000")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA cache_size=-20000")
+    return conn
+
+
+class ConnectionPool:
+    """Long-lived SQLite connections: one serialized writer plus a fixed-size pool of readers"""
+
+    def __init__(self, database: str, size: int = 5):
+        self.database = database
+        self.size = size
+        self._idle = queue.Queue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    def _connect_reader(self):
+        """Open a reader connection that refuses writes"""
+        conn = _connect_sqlite(self.database)
+        conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def _checkout(self):
+        """Take an idle connection, opening a new one while below the pool size"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._created < self.size
+            if can_open:
+                self._created += 1
+
+        if not can_open:
+            return self._idle.get()
+
+        try:
+            return self._connect_reader()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    @contextmanager
+    def acquire_writer(self):
+        """Hold the single writer connection; writes are serialized in-process instead of contending on SQLITE_BUSY"""
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = _connect_sqlite(self.database)
+            try:
+                yield self._writer
+            finally:
+                if self._writer.in_transaction:
+                    self._writer.rollback()
+
+    @contextmanager
+    def acquire(self):
+        """Check out a reader connection for the duration of a ``with`` block"""
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            # Never hand a connection with an open transaction to the next caller
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def close(self):
+        """Close the writer and every idle reader"""
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+# Statements execute(fetch=True) can send to a reader (WITH is left out: it can prefix a write)
+_READ_ONLY_PREFIXES = ('SELECT', 'EXPLAIN')
+
+# Precompiled patterns for _sqlite_to_postgresql
+_INSERT_OR_IGNORE = re.compile(r'INSERT\s+OR\s+IGNORE\s+INTO', re.IGNORECASE)
+_INSERT_OR_REPLACE = re.compile(
+    r'INSERT\s+OR\s+REPLACE\s+INTO\s+(\w+)\s*\(([^)]+)\)\s*VALUES\s*(\([^)]+\))', re.IGNORECASE
+)
+
+
+@functools.lru_cache(maxsize=256)
+def _sqlite_to_postgresql(query: str) -> str:
+    """Translate SQLite-specific SQL to PostgreSQL (cached: the bot issues a small fixed set of queries)"""
+    # Replace AUTOINCREMENT with SERIAL (handled in table creation)
+    query = query.replace('INTEGER PRIMARY KEY AUTOINCREMENT', 'SERIAL PRIMARY KEY')
+    query = query.replace('AUTOINCREMENT', '')
+    
+    # Replace INSERT OR IGNORE with INSERT ... ON CONFLICT DO NOTHING
+    match = _INSERT_OR_IGNORE.search(query)
+    if match:
+        return f"INSERT INTO{query[match.end():].rstrip()} ON CONFLICT DO NOTHING"
+
+    # Replace INSERT OR REPLACE with INSERT ... ON CONFLICT
+    match = _INSERT_OR_REPLACE.search(query)
+    if match:
+        table_name, columns, values = match.groups()
+        cols = [c.strip() for c in columns.split(',')]
+        # The first column is treated as the conflict (primary) key; update the rest
+        updates = ", ".join(f"{col} = EXCLUDED.{col}" for col in cols[1:])
+        action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        return f"INSERT INTO {table_name} ({columns}) VALUES {values} ON CONFLICT ({cols[0]}) {action}"
+    
+    return query
+
 
 class Database:
     """Database abstraction class supporting SQLite and PostgreSQL"""
@@ -57,8 +242,19 @@ class Database:
     def __init__(self):
         self.db_type = None
         self.connection_string = None
-        self._conn = None
+        self._pool = None
+        self._pg_pool = None
+        self._pg_pool_lock = threading.Lock()
+        self._pg_slots = None
+        # id(conn) -> monotonic time it was returned to the PostgreSQL pool
+        self._pg_returned = {}
         self._detect_database_type()
+        if self.db_type == 'sqlite':
+            self._pool = ConnectionPool(
+                self.connection_string,
+                size=int(os.getenv('SQLITE_POOL_SIZE', '5'))
+            )
+        atexit.register(self.close)
     
     def _detect_database_type(self):
         """Detect database type from environment variables"""
@@ -74,264 +270,330 @@ class Database:
             else:
                 self.db_type = 'sqlite'
                 self.connection_string = database_url.replace('sqlite:///', '') if database_url.startswith('sqlite:///') else 'bookbot.db'
-                logger.info(f"Using SQLite database: {self.connection_string}")
+                logger.info("Using SQLite database: %s", self.connection_string)
         else:
             # Default to SQLite for local development
             self.db_type = 'sqlite'
             self.connection_string = 'bookbot.db'
             logger.info("Using SQLite database (default)")
     
+    def close(self):
+        """Close pooled connections (registered with atexit; the last SQLite close checkpoints the WAL)"""
+        if self._pool is not None:
+            self._pool.close()
+        if self._pg_pool is not None:
+            self._pg_pool.closeall()
+
     def get_connection(self):
         """Get database connection"""
         if self.db_type == 'postgresql':
-            if not PSYCOPG2_AVAILABLE:
-                raise ImportError("psycopg2 is required for PostgreSQL. Install it with: pip install psycopg2-binary")
-            return psycopg2.connect(self.connection_string)
+            return _load_psycopg2().connect(self.connection_string)
         else:
-            conn = sqlite3.connect(
-                self.connection_string,
-                detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES
-            )
-            conn.execute("PRAGMA foreign_keys = ON")
-            return conn
+            return _connect_sqlite(self.connection_string)
+
+    def _get_pg_pool(self):
+        """Create the PostgreSQL connection pool on first use"""
+        if self._pg_pool is None:
+            with self._pg_pool_lock:
+                if self._pg_pool is None:
+                    _load_psycopg2()
+                    maxconn = int(os.getenv('PG_POOL_MAX', '10'))
+                    # ThreadedConnectionPool raises instead of waiting when exhausted; the semaphore makes callers wait
+                    self._pg_slots = threading.BoundedSemaphore(maxconn)
+                    self._pg_pool = psycopg2.pool.ThreadedConnectionPool(1, maxconn, self.connection_string)
+        return self._pg_pool
+
+    def _checkout_pg(self, pool):
+        """Take a live connection from the PostgreSQL pool, discarding ones the server has dropped"""
+        while True:
+            conn = pool.getconn()
+            # Fresh connections have no entry and get pinged once too
+            idle_since = self._pg_returned.pop(id(conn), None)
+            if conn.closed:
+                pool.putconn(conn, close=True)
+                continue
+            if idle_since is not None and time.monotonic() - idle_since < PG_IDLE_CHECK_SECONDS:
+                return conn
+            try:
+                conn.cursor().execute('SELECT 1')
+                return conn
+            except psycopg2.Error as e:
+                # Server restart, failover or idle timeout; the pool opens a new connection next time
+                logger.warning("Discarding stale PostgreSQL connection: %s", e)
+                pool.putconn(conn, close=True)
+
+    @contextmanager
+    def connection(self, write: bool = False):
+        """Yield a pooled connection (for SQLite, the shared writer if write=True)"""
+        if self.db_type == 'postgresql':
+            pool = self._get_pg_pool()
+            with self._pg_slots:
+                conn = self._checkout_pg(pool)
+                broken = False
+                try:
+                    yield conn
+                finally:
+                    # Reads leave a transaction open; end it before the connection is reused
+                    try:
+                        if not conn.closed:
+                            conn.rollback()
+                    except psycopg2.Error:
+                        broken = True
+                    broken = broken or bool(conn.closed)
+                    if not broken:
+                        self._pg_returned[id(conn)] = time.monotonic()
+                    pool.putconn(conn, close=broken)
+        elif write:
+            with self._pool.acquire_writer() as conn:
+                yield conn
+        else:
+            with self._pool.acquire() as conn:
+                yield conn
     
-    def execute(self, query: str, params: tuple = None, fetch: bool = False):
-        """Execute a query and return results if fetch=True"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            # Convert SQLite syntax to PostgreSQL if needed
-            if self.db_type == 'postgresql':
-                query = self._convert_sqlite_to_postgresql(query)
-                if params:
-                    # Convert ? placeholders to %s
-                    query = query.replace('?', '%s')
-            
+    def _cursor(self, conn):
+        """Cursor for a checked-out connection (reused per SQLite connection)"""
+        if self.db_type == 'sqlite':
+            return conn.shared_cursor()
+        return conn.cursor()
+
+    def _begin_write(self, cursor):
+        """Take SQLite's write lock up front so a write never hits SQLITE_BUSY mid-transaction"""
+        if self.db_type == 'sqlite':
+            cursor.execute('BEGIN IMMEDIATE')
+
+    def _translate(self, query: str, params=None) -> str:
+        """Rewrite a SQLite query for the active backend"""
+        if self.db_type == 'postgresql':
+            query = self._convert_sqlite_to_postgresql(query)
             if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
+                # Convert ? placeholders to %s
+                query = query.replace('?', '%s')
+        return query
+
+    @retry_on_busy
+    def _write(self, query: str, params: tuple = None, fetch: bool = False):
+        """Run an already-translated write query in its own transaction"""
+        with self.connection(write=True) as conn:
+            cursor = self._cursor(conn)
             
-            if fetch:
-                if self.db_type == 'postgresql':
-                    # PostgreSQL returns tuples
-                    results = cursor.fetchall()
+            try:
+                self._begin_write(cursor)
+
+                if params:
+                    cursor.execute(query, params)
                 else:
+                    cursor.execute(query)
+                
+                if fetch:
                     results = cursor.fetchall()
-                conn.commit()
-                conn.close()
-                return results
-            else:
-                conn.commit()
-                conn.close()
-                return cursor.rowcount
-        except Exception as e:
-            conn.rollback()
-            conn.close()
-            raise e
-    
-    def execute_fetchone(self, query: str, params: tuple = None):
-        """Execute a query and return one result"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            if self.db_type == 'postgresql':
-                query = self._convert_sqlite_to_postgresql(query)
-                if params:
-                    query = query.replace('?', '%s')
+                    conn.commit()
+                    return results
+                else:
+                    conn.commit()
+                    return cursor.rowcount
+            except Exception as e:
+                conn.rollback()
+                raise e
+
+    def _read(self, query: str, params: tuple = None, one: bool = False):
+        """Run an already-translated read query on a reader connection"""
+        with self.connection() as conn:
+            cursor = self._cursor(conn)
             
             if params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
             
-            result = cursor.fetchone()
-            conn.close()
-            return result
-        except Exception as e:
-            conn.close()
-            raise e
+            return cursor.fetchone() if one else cursor.fetchall()
+
+    def execute(self, query: str, params: tuple = None, fetch: bool = False):
+        """Execute a query and return results if fetch=True"""
+        query = self._translate(query, params)
+        # Plain reads need neither the writer nor a commit
+        if fetch and query.lstrip()[:7].upper().startswith(_READ_ONLY_PREFIXES):
+            return self._read(query, params)
+        return self._write(query, params, fetch)
+    
+    def execute_fetchone(self, query: str, params: tuple = None):
+        """Execute a query and return one result"""
+        return self._read(self._translate(query, params), params, one=True)
     
     def execute_fetchall(self, query: str, params: tuple = None):
         """Execute a query and return all results"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        return self._read(self._translate(query, params), params)
+    
+    def iter_fetch(self, query: str, params: tuple = None, chunk: int = 500):
+        """Yield result rows in chunks instead of materializing them all (holds a connection until exhausted)"""
+        query = self._translate(query, params)
+        with self.connection() as conn:
             if self.db_type == 'postgresql':
-                query = self._convert_sqlite_to_postgresql(query)
-                if params:
-                    query = query.replace('?', '%s')
-            
-            if params:
-                cursor.execute(query, params)
+                # Named cursor: rows stay on the server until fetched
+                cursor = conn.cursor(name=f'iter_fetch_{id(conn):x}')
+                cursor.itersize = chunk
             else:
-                cursor.execute(query)
+                cursor = self._cursor(conn)
             
-            results = cursor.fetchall()
-            conn.close()
-            return results
-        except Exception as e:
-            conn.close()
-            raise e
+            try:
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+                
+                while True:
+                    rows = cursor.fetchmany(chunk)
+                    if not rows:
+                        break
+                    yield from rows
+            finally:
+                if self.db_type == 'postgresql':
+                    cursor.close()
+    
+    def execute_many(self, query: str, rows: list):
+        """Execute a query once per parameter row inside a single transaction.
+
+        Prefer this over calling execute() in a loop. Returns the affected row count on SQLite;
+        PostgreSQL's batched path doesn't report one and returns -1.
+        """
+        return self._write_many(self._translate(query, rows), rows)
+
+    @retry_on_busy
+    def _write_many(self, query: str, rows: list):
+        """Run an already-translated query for every row in one transaction"""
+        with self.connection(write=True) as conn:
+            cursor = self._cursor(conn)
+            
+            try:
+                self._begin_write(cursor)
+                if self.db_type == 'postgresql':
+                    # executemany is one round-trip per row in psycopg2; execute_batch sends pages of statements
+                    psycopg2.extras.execute_batch(cursor, query, rows, page_size=100)
+                    conn.commit()
+                    return -1
+                cursor.executemany(query, rows)
+                conn.commit()
+                return cursor.rowcount
+            except Exception as e:
+                conn.rollback()
+                raise e
     
+    @retry_on_busy
     def execute_with_cursor(self, callback):
         """Execute operations with cursor access (for complex operations)"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            result = callback(cursor, conn)
-            conn.commit()
-            return result
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            conn.close()
+        with self.connection(write=True) as conn:
+            cursor = self._cursor(conn)
+            
+            try:
+                self._begin_write(cursor)
+                result = callback(cursor, conn)
+                conn.commit()
+                return result
+            except Exception as e:
+                conn.rollback()
+                raise e
     
     def _convert_sqlite_to_postgresql(self, query: str) -> str:
         """Convert SQLite-specific SQL to PostgreSQL"""
-        # Replace AUTOINCREMENT with SERIAL (handled in table creation)
-        query = query.replace('INTEGER PRIMARY KEY AUTOINCREMENT', 'SERIAL PRIMARY KEY')
-        query = query.replace('AUTOINCREMENT', '')
-        
-        # Replace INSERT OR REPLACE with INSERT ... ON CONFLICT
-        if 'INSERT OR REPLACE INTO' in query.upper():
-            try:
-                # Extract table name and values
-                query_upper = query.upper()
-                table_start = query_upper.find('INSERT OR REPLACE INTO') + len('INSERT OR REPLACE INTO')
-                table_end = query_upper.find('(', table_start)
-                table_name = query[table_start:table_end].strip()
-
-                # Find the column list
-                col_start = query.find('(', table_end)
-                col_end = query.find(')', col_start)
-                columns = query[col_start+1:col_end]
-
-                # Find VALUES
-                values_start = query_upper.find('VALUES', col_end)
-                values_end = query.find(')', values_start + 6)
-                values = query[values_start + 6:values_end + 1]
-
-                # Extract primary key column (first column in INSERT OR REPLACE)
-                first_col = columns.split(',')[0].strip()
-
-                # Reconstruct as INSERT ... ON CONFLICT
-                new_query = f"INSERT INTO {table_name} ({columns}) {values} ON CONFLICT ({first_col}) DO UPDATE SET "
-                # Update all columns except the primary key
-                cols = [c.strip() for c in columns.split(',')]
-                updates = [f"{col} = EXCLUDED.{col}" for col in cols[1:]]  # Skip first (primary key)
-                new_query += ", ".join(updates)
-
-                return new_query
-            except Exception as e:
-                logger.warning(f"Could not convert INSERT OR REPLACE query to PostgreSQL ON CONFLICT form: {e}")
-                return query
-        
-        # Replace julianday() with PostgreSQL date comparison
-        if 'julianday' in query.lower():
-            import re
-            # Replace julianday(column) <= julianday(?) with column <= ?
-            # This works because PostgreSQL can compare timestamps directly
-            query = re.sub(
-                r'julianday\(([^)]+)\)\s*<=\s*julianday\(([^)]+)\)',
-                r'\1 <= \2',
-                query,
-                flags=re.IGNORECASE
-            )
-            # Replace remaining julianday() calls
-            query = re.sub(
-                r'julianday\(([^)]+)\)',
-                r'\1',
-                query,
-                flags=re.IGNORECASE
-            )
-        
-        return query
+        return _sqlite_to_postgresql(query)
     
-    def init_database(self):
-        """Initialize database tables"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        try:
-            if self.db_type == 'postgresql':
-                # PostgreSQL table creation
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS posts (
-                        id SERIAL PRIMARY KEY,
-                        user_id BIGINT,
-                        message_id BIGINT,
-                        channel_message_id BIGINT,
-                        channel_message_ids TEXT,
-                        text_content TEXT,
-                        file_ids TEXT,
-                        status TEXT DEFAULT 'POSTED',
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS admins (
-                        user_id BIGINT PRIMARY KEY,
-                        username TEXT,
-                        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS callback_mappings (
-                        callback_hash TEXT PRIMARY KEY,
-                        file_id TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-            else:
-                # SQLite table creation
-                conn.execute("PRAGMA foreign_keys = ON")
+    def init_database(self, force: bool = False):
+        """Initialize database tables (SQLite skips this once the schema is current)"""
+        with self.connection(write=True) as conn:
+            cursor = self._cursor(conn)
+            
+            try:
+                if self.db_type == 'sqlite' and not force:
+                    cursor.execute('PRAGMA user_version')
+                    if cursor.fetchone()[0] >= SCHEMA_VERSION:
+                        logger.info("Database schema is up to date")
+                        return
+
+                self._begin_write(cursor)
+
+                if self.db_type == 'postgresql':
+                    # PostgreSQL table creation
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS posts (
+                            id SERIAL PRIMARY KEY,
+                            user_id BIGINT,
+                            message_id BIGINT,
+                            channel_message_id BIGINT,
+                            channel_message_ids TEXT,
+                            text_content TEXT,
+                            file_ids TEXT,
+                            status TEXT DEFAULT 'POSTED',
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                    ''')
                 
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS posts (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id BIGINT,
-                        message_id BIGINT,
-                        channel_message_id BIGINT,
-                        channel_message_ids TEXT,
-                        text_content TEXT,
-                        file_ids TEXT,
-                        status TEXT DEFAULT 'POSTED',
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS admins (
+                            user_id BIGINT PRIMARY KEY,
+                            username TEXT,
+                            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                    ''')
+
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS callback_mappings (
+                            callback_hash TEXT PRIMARY KEY,
+                            file_id TEXT,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                    ''')
+                else:
+                    # SQLite table creation
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS posts (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            user_id BIGINT,
+                            message_id BIGINT,
+                            channel_message_id BIGINT,
+                            channel_message_ids TEXT,
+                            text_content TEXT,
+                            file_ids TEXT,
+                            status TEXT DEFAULT 'POSTED',
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                    ''')
                 
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS admins (
-                        user_id BIGINT PRIMARY KEY,
-                        username TEXT,
-                        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS callback_mappings (
-                        callback_hash TEXT PRIMARY KEY,
-                        file_id TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS admins (
+                            user_id BIGINT PRIMARY KEY,
+                            username TEXT,
+                            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                    ''')
+
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS callback_mappings (
+                            callback_hash TEXT PRIMARY KEY,
+                            file_id TEXT,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                    ''')
+
+                # Indexes (same DDL for SQLite and PostgreSQL)
+                # created_at: age-based cleanup in db_manager and callback mapping pruning
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_posts_created_at ON posts(created_at)')
+                # Nothing filters posts by user_id; drop the index earlier schemas created
+                cursor.execute('DROP INDEX IF EXISTS idx_posts_user')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_callback_mappings_created_at ON callback_mappings(created_at)')
+                # channel_message_id: import_channel dedup; not UNIQUE so existing duplicate rows don't block startup
+                cursor.execute(
+                    'CREATE INDEX IF NOT EXISTS idx_posts_channel_msg_id ON posts(channel_message_id) '
+                    'WHERE channel_message_id IS NOT NULL'
+                )
+
+                if self.db_type == 'sqlite':
+                    cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
             
-            conn.commit()
-            logger.info("Database initialized successfully")
-        except Exception as e:
-            conn.rollback()
-            logger.error(f"Error initializing database: {e}")
-            raise
-        finally:
-            conn.close()
+                conn.commit()
+                logger.info("Database initialized successfully")
+            except Exception as e:
+                conn.rollback()
+                logger.error("Error initializing database: %s", e)
+                raise
 
 
 # Global database instance
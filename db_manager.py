@@ -14,26 +14,28 @@ def init_database():
 
 def show_posts():
     """Show all posts"""
-    posts = db.execute_fetchall('''
-        SELECT id, user_id, created_at, repost_count, 
-               channel_message_id, text_content
+    count = 0
+    for post in db.iter_fetch('''
+        SELECT id, user_id, created_at, channel_message_id, text_content
         FROM posts 
         ORDER BY created_at DESC
-    ''')
-    
-    if not posts:
-        print("📭 No posts found in database.")
-        return
-    
-    print(f"📚 Found {len(posts)} posts:")
-    print("-" * 80)
-    
-    for post in posts:
-        post_id, user_id, created_at, repost_count, channel_msg_id, text_content = post
+    '''):
+        if count == 0:
+            print("📚 Posts:")
+            print("-" * 80)
+        count += 1
+        
+        post_id, user_id, created_at, channel_msg_id, text_content = post
+        text_content = text_content or ''
         print(f"ID: {post_id} | User: {user_id} | Created: {created_at}")
-        print(f"Reposts: {repost_count} | Channel MSG: {channel_msg_id}")
+        print(f"Channel MSG: {channel_msg_id}")
         print(f"Content: {text_content[:100]}{'...' if len(text_content) > 100 else ''}")
         print("-" * 80)
+    
+    if count == 0:
+        print("📭 No posts found in database.")
+    else:
+        print(f"📚 Found {count} posts")
 
 
 def delete_post(post_id):
@@ -65,21 +67,18 @@ def reset_database():
     db.execute('DROP TABLE IF EXISTS admins')
 
     # Re-initialize schema
-    db.init_database()
+    db.init_database(force=True)
     print("✅ Database reset complete!")
 
 def show_stats():
     """Show database statistics"""
-    # Total posts
-    result = db.execute_fetchone('SELECT COUNT(*) FROM posts')
-    total_posts = result[0] if result else 0
-    
-    # Active posts (all posts are now active)
-    active_posts = total_posts
+    # Both counts in one round-trip
+    result = db.execute_fetchone('SELECT (SELECT COUNT(*) FROM posts), (SELECT COUNT(*) FROM admins)')
+    total_posts, total_admins = result if result else (0, 0)
     
     print("Database Statistics:")
     print(f"Total posts: {total_posts}")
-    print(f"Total admins: {db.execute_fetchone('SELECT COUNT(*) FROM admins')[0]}")
+    print(f"Total admins: {total_admins}")
 
 def main():
     """Main function"""
@@ -11,7 +11,6 @@ This script imports messages with photos/captions into the local database storin
 from dotenv import load_dotenv
 import os
 import sys
-import json
 import asyncio
 import logging
 from telethon import TelegramClient
@@ -38,41 +37,78 @@ except (TypeError, ValueError):
     logging.warning("Invalid IMPORT_LIMIT value; using default 500")
     LIMIT = 500
 
+# Rows written per transaction
+BATCH_SIZE = 500
+
+EMPTY_JSON_LIST = "[]"
+
+INSERT_POST = '''
+    INSERT INTO posts (user_id, message_id, channel_message_id, channel_message_ids, text_content, file_ids, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
 if API_ID is None or not API_HASH or not CHANNEL:
     logging.error("Set TELETHON_API_ID, TELETHON_API_HASH and CHANNEL_ID in .env")
     sys.exit(1) 
 
+async def produce(client, existing, batches):
+    """Fetch channel messages and queue new posts as row batches"""
+    rows = []
+    async for m in client.iter_messages(CHANNEL, limit=LIMIT):
+        # We only import messages with media (photo) or a caption/text
+        has_media = m.media is not None
+        text = m.message or m.caption
+        # Ensure we have at least an image and text (similar to how bot handles posts)
+        if not has_media:
+            continue
+        if not text:
+            continue
+
+        # Skip if already imported
+        if m.id in existing:
+            continue
+        existing.add(m.id)
+
+        user_id = getattr(m.from_id, 'user_id', None) or 0
+        # Same 'YYYY-MM-DD HH:MM:SS' form as CURRENT_TIMESTAMP, without strftime's format parsing
+        created_at = m.date.astimezone(timezone.utc).replace(tzinfo=None).isoformat(' ', 'seconds')
+        # JSON list of one int; no encoder needed
+        channel_ids_json = f"[{m.id}]"
+
+        # For file_ids we don't have bot file_ids, so leave empty list
+        rows.append((user_id, 0, m.id, channel_ids_json, text, EMPTY_JSON_LIST, created_at))
+
+        if len(rows) >= BATCH_SIZE:
+            await batches.put(rows)
+            rows = []
+
+    if rows:
+        await batches.put(rows)
+    # Tell the consumer there is nothing more to write
+    await batches.put(None)
+
+async def consume(batches):
+    """Write queued row batches, one transaction each; returns the number of rows written"""
+    count = 0
+    while (rows := await batches.get()) is not None:
+        await asyncio.to_thread(db.execute_many, INSERT_POST, rows)
+        count += len(rows)
+    return count
+
 async def run():
     async with TelegramClient('import_session', int(API_ID), API_HASH) as client:
-        count = 0
-        async for m in client.iter_messages(CHANNEL, limit=LIMIT):
-            # We only import messages with media (photo) or a caption/text
-            has_media = m.media is not None
-            text = m.message or m.caption
-            # Ensure we have at least an image and text (similar to how bot handles posts)
-            if not has_media:
-                continue
-            if not text:
-                continue
-
-            # Skip if already imported (run DB call in thread to avoid blocking event loop)
-            exists = await asyncio.to_thread(db.execute_fetchone, 'SELECT id FROM posts WHERE channel_message_id = ?', (m.id,))
-            if exists:
-                continue
-
-            user_id = getattr(m.from_id, 'user_id', None) or 0
-            created_at = m.date.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
-            channel_ids_json = json.dumps([m.id])
-
-            # For file_ids we don't have bot file_ids, so leave empty list
-            file_ids_json = json.dumps([])
-
-            await asyncio.to_thread(db.execute, '''
-                INSERT INTO posts (user_id, message_id, channel_message_id, channel_message_ids, text_content, file_ids, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (user_id, 0, m.id, channel_ids_json, text, file_ids_json, created_at))
-
-            count += 1
+        # Load already-imported ids once instead of querying per message
+        existing = {row[0] for row in await asyncio.to_thread(
+            db.execute_fetchall, 'SELECT channel_message_id FROM posts WHERE channel_message_id IS NOT NULL'
+        )}
+
+        # Fetching the next page overlaps with writing the previous batch;
+        # the small queue bound keeps memory flat if the DB falls behind
+        batches = asyncio.Queue(maxsize=2)
+        _, count = await asyncio.gather(
+            produce(client, existing, batches),
+            consume(batches),
+        )
 
         print(f"Imported {count} posts from {CHANNEL}")
 